@@ -1,4 +1,31 @@
-from setuptools import setup, find_packages
+import sys
+from setuptools import setup, find_packages, Extension
+
+
+def get_extensions():
+    # The compiled extensions are optional speed-ups. If Cython is not
+    # available, or the compilation fails, then the pure Python
+    # implementations are used.
+    try:
+        from Cython.Build import cythonize
+    except ImportError:
+        return []
+    if sys.platform == 'win32':
+        compile_args = ['/O2', '/openmp']
+        link_args = []
+    elif sys.platform == 'darwin':
+        # Apple's clang does not support OpenMP out of the box
+        compile_args = ['-O3']
+        link_args = []
+    else:
+        compile_args = ['-O3', '-fopenmp']
+        link_args = ['-fopenmp']
+    extensions = [
+        Extension('trafficsignrecognition.feature._rgb2hsi',
+                  ['trafficsignrecognition/feature/_rgb2hsi.pyx'],
+                  extra_compile_args=compile_args,
+                  extra_link_args=link_args, optional=True)]
+    return cythonize(extensions, language_level=3)
 
 
 setup(
@@ -8,6 +35,7 @@ setup(
     author='Epameinondas Antonakos',
     author_email='antonakosn@gmail.com',
     packages=find_packages(),
+    ext_modules=get_extensions(),
     install_requires=['menpofit>=0.4,<0.5',
                       'menpowidgets>=0.2,<0.3']
 )
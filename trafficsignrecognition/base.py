@@ -1,6 +1,8 @@
 import os
+import multiprocessing
 import numpy as np
 from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 
 from menpo.base import name_of_callable
 from menpo.shape import bounding_box
@@ -8,12 +10,31 @@ from menpofit.visualize import print_progress
 from menpo.visualize import print_dynamic
 from menpo.transform import Scale
 from menpo.image import Image
+from menpo.feature import no_op
 
 from .correlationfilter import CorrelationFilter
-from .normalisation import (normalise_norm_array, image_normalisation,
-                            create_cosine_mask)
+from .normalisation import (normalise_norm_array, normalise_norm_array_into,
+                            image_normalisation, create_cosine_mask)
 from .feature import fast_dsift_hsi
 from .result import DetectionResult, print_str, ClassificationResult
+from .slots import SlotsPickleMixin
+
+
+# The minimum number of training images for which the pre-processing is
+# performed in parallel processes, since for fewer images the cost of starting
+# the processes dominates.
+MIN_IMAGES_FOR_PARALLEL_PREPROCESSING = 100
+
+
+def _preprocessing_mp_context():
+    r"""
+    Returns the multiprocessing context of the pre-processing processes. The
+    processes are not forked, because forking a process that has already used
+    OpenMP (e.g. by the compiled or the `numba` rgb2hsi kernels) is unsafe.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
 
 
 def data_dir_path():
@@ -183,6 +204,114 @@ def non_max_suppression(bboxes, scores, overlap_thresh):
     return [bboxes[i] for i in pick], [scores[i] for i in pick]
 
 
+def preprocess_image(image, features=no_op, normalisation=normalise_norm_array,
+                     cosine_mask=None):
+    r"""
+    Method that pre-processes a training image by extracting features and
+    normalising it.
+
+    Parameters
+    ----------
+    image : `menpo.image.Image`
+        The input menpo image object.
+    features : `callable`, optional
+        The holistic dense features to be extracted from the image.
+    normalisation : `callable` or ``None``, optional
+        The callable to be used for normalising the image. If ``None``, then no
+        normalisation is applied.
+    cosine_mask : `ndarray` or ``None``, optional
+        The cosine mask (Hanning window) to be applied on the image. If
+        ``None``, then no mask is applied.
+
+    Returns
+    -------
+    pixels : ``(C, X, Y)`` `ndarray`
+        The pixels of the pre-processed image.
+    """
+    if features is not no_op:
+        image = features(image)
+    # Skip the normalisation call altogether if it would not change the image
+    if normalisation not in (None, no_op) or cosine_mask is not None:
+        image = image_normalisation(image, normalisation=normalisation,
+                                    cosine_mask=cosine_mask)
+    return image.pixels
+
+
+def preprocess_images(images, features=no_op,
+                      normalisation=normalise_norm_array, cosine_mask=None,
+                      n_jobs=1, prefix='', verbose=True):
+    r"""
+    Method that pre-processes a set of training images and stacks them in a
+    single array.
+
+    Parameters
+    ----------
+    images : `list` of `menpo.image.Image`
+        The training images.
+    features : `callable`, optional
+        The holistic dense features to be extracted from the images.
+    normalisation : `callable` or ``None``, optional
+        The callable to be used for normalising the images. If ``None``, then
+        no normalisation is applied.
+    cosine_mask : `ndarray` or ``None``, optional
+        The cosine mask (Hanning window) to be applied on the images. If
+        ``None``, then no mask is applied.
+    n_jobs : `int`, optional
+        The number of processes used for pre-processing the images. If ``-1``,
+        then all the available CPUs are used. The processes are started with
+        the ``forkserver`` (or ``spawn``) method, thus the features and
+        normalisation callables must be picklable.
+    prefix : `str`, optional
+        The prefix of the progress bar.
+    verbose : `bool`, optional
+        If ``True``, then a progress bar is printed.
+
+    Returns
+    -------
+    data : ``(n_images, C, X, Y)`` `ndarray`
+        The pre-processed images in single precision.
+    """
+    wrap = partial(print_progress, prefix=prefix + 'Pre-processing data',
+                   n_items=len(images), verbose=verbose,
+                   end_with_newline=False)
+
+    # Fast path of the default pre-processing without features and cosine
+    # mask, in which each image is normalised directly into the data array.
+    if (features is no_op and normalisation is normalise_norm_array and
+            cosine_mask is None):
+        data = np.empty((len(images),) + images[0].pixels.shape,
+                        dtype=np.float32)
+        for i, im in enumerate(wrap(images)):
+            normalise_norm_array_into(im.pixels, data[i])
+        return data
+
+    preprocess = partial(preprocess_image, features=features,
+                         normalisation=normalisation, cosine_mask=cosine_mask)
+    data = None
+    executor = None
+    if n_jobs != 1 and len(images) >= MIN_IMAGES_FOR_PARALLEL_PREPROCESSING:
+        # Pre-process the images in parallel processes
+        n_workers = (os.cpu_count() or 1) if n_jobs == -1 else n_jobs
+        executor = ProcessPoolExecutor(max_workers=n_workers,
+                                       mp_context=_preprocessing_mp_context())
+        chunksize = max(1, len(images) // (4 * n_workers))
+        all_pixels = executor.map(preprocess, images, chunksize=chunksize)
+    else:
+        all_pixels = map(preprocess, images)
+    try:
+        for i, pixels in enumerate(wrap(all_pixels)):
+            # Allocate the data array once the shape of the pre-processed
+            # images is known
+            if data is None:
+                data = np.empty((len(images),) + pixels.shape,
+                                dtype=np.float32)
+            data[i] = pixels
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return data
+
+
 def attach_bboxes_to_image(image, bboxes):
     r"""
     Method that attaches the given bounding boxes to the landmark manager of the
@@ -192,14 +321,15 @@ def attach_bboxes_to_image(image, bboxes):
         image.landmarks['bbox_{:0{}d}'.format(i, len(str(len(bboxes))))] = bbox
 
 
-class Detector(object):
+class Detector(SlotsPickleMixin):
     r"""
     Class for training a multi-channel correlation filter object detector.
 
     Parameters
     ----------
-    images : `list` of `menpo.image.Image`
-        The training images from which to learn the detector.
+    images : `list` of `menpo.image.Image` or ``None``
+        The training images from which to learn the detector. It can only be
+        ``None`` when the detector is created with `from_preprocessed`.
     algorithm : ``{'mosse', 'mccf'}``, optional
         If 'mosse', then the Minimum Output Sum of Squared Errors (MOSSE)
         filter [1] will be used. If 'mccf', then the Multi-Channel Correlation
@@ -208,8 +338,9 @@ class Detector(object):
         The shape of the filter.
     features : `callable`, optional
         The holistic dense features to be extracted from the images.
-    normalisation : `callable`, optional
-        The callable to be used for normalising the images.
+    normalisation : `callable` or ``None``, optional
+        The callable to be used for normalising the images. If ``None``, then
+        no normalisation is applied.
     cosine_mask : `bool`, optional
         If ``True``, then a cosine mask (Hanning window) will be applied on the
         images.
@@ -220,6 +351,19 @@ class Detector(object):
         Regularization parameter of the correlation filter.
     boundary : ``{'constant', 'symmetric'}``, optional
         Determines the type of padding that will be applied on the images.
+    n_jobs : `int`, optional
+        The number of processes used for pre-processing the training images.
+        If ``-1``, then all the available CPUs are used. Note that the images
+        are pre-processed in parallel only if there are at least
+        ``MIN_IMAGES_FOR_PARALLEL_PREPROCESSING`` of them.
+    backend : ``{'numpy', 'cupy'}``, optional
+        If 'cupy', then the correlation filter is trained on the GPU using
+        `cupy`. The pre-processing of the images is always performed on the
+        CPU.
+    lazy : `bool`, optional
+        If ``True``, then the pre-processing and training are deferred until
+        the trained model is first needed (e.g. by `detect`) or `train` is
+        called explicitly.
     prefix : `str`, optional
         The prefix of the progress bar.
     verbose : `bool`, optional
@@ -235,10 +379,15 @@ class Detector(object):
         Correlation Filters". IEEE Proceedings of International Conference on
         Computer Vision (ICCV), 2013.
     """
+    __slots__ = ('algorithm', 'features', 'filter_shape', 'normalisation',
+                 'cosine_mask', 'boundary', 'model', '_images', '_data',
+                 '_training_kwargs')
+
     def __init__(self, images, algorithm='mosse', filter_shape=(25, 25),
                  features=fast_dsift_hsi, normalisation=normalise_norm_array,
                  cosine_mask=False, response_covariance=2, l=0.01,
-                 boundary='symmetric', prefix='', verbose=True):
+                 boundary='symmetric', n_jobs=1, backend='numpy', lazy=False,
+                 prefix='', verbose=True):
         # Assign properties
         self.algorithm = algorithm
         self.features = features
@@ -247,38 +396,101 @@ class Detector(object):
         self.cosine_mask = cosine_mask
         self.boundary = boundary
 
-        # Create cosine mask if asked
-        cosine_mask = None
-        if cosine_mask:
-            cosine_mask = create_cosine_mask(filter_shape)
+        # Keep the training images and options until the model is trained
+        self.model = None
+        self._images = images
+        self._data = None
+        self._training_kwargs = dict(
+            response_covariance=response_covariance, l=l, n_jobs=n_jobs,
+            backend=backend, prefix=prefix, verbose=verbose)
+
+        if not lazy:
+            self.train()
+
+    @classmethod
+    def from_preprocessed(cls, path, **kwargs):
+        r"""
+        Create a lazy detector from training images that have already been
+        pre-processed and saved with ``np.save``, e.g. the output of
+        `preprocess_images`. The array is memory-mapped, thus it is only read
+        from the disk during training.
+
+        Parameters
+        ----------
+        path : `str` or `pathlib.Path`
+            The path of the ``.npy`` file with the ``(n_images, C, X, Y)``
+            pre-processed images.
+        kwargs : `dict`, optional
+            The rest of the arguments of `Detector`. Note that ``features``,
+            ``normalisation`` and ``cosine_mask`` must be the ones with which
+            the images were pre-processed, since they are also used during
+            detection.
+
+        Returns
+        -------
+        detector : `Detector`
+            The detector, which is trained on its first use.
+        """
+        kwargs['lazy'] = True
+        detector = cls(None, **kwargs)
+        detector._data = np.load(str(path), mmap_mode='r')
+        return detector
+
+    def train(self):
+        r"""
+        Pre-process the training images and train the correlation filter. It is
+        called automatically the first time that the trained model is needed,
+        thus it only needs to be called explicitly by lazy detectors that must
+        be trained at a specific point. If the model is already trained, then
+        this method does nothing.
+
+        Returns
+        -------
+        detector : `Detector`
+            The detector itself.
+        """
+        if self.model is not None:
+            return self
+        kwargs = self._training_kwargs
+        prefix = kwargs['prefix']
+        verbose = kwargs['verbose']
 
         # Prepare data
-        wrap = partial(print_progress, prefix=prefix + 'Pre-processing data',
-                       verbose=verbose, end_with_newline=False)
-        normalized_data = []
-        for im in wrap(images):
-            im = features(im)
-            im = image_normalisation(im, normalisation=normalisation,
-                                     cosine_mask=cosine_mask)
-            normalized_data.append(im.pixels)
-
-        # Create data array
-        normalized_data = np.asarray(normalized_data)
+        normalized_data = self._data
+        if normalized_data is None:
+            # Create cosine mask if asked
+            mask = None
+            if self.cosine_mask:
+                mask = create_cosine_mask(self.filter_shape)
+
+            normalized_data = preprocess_images(
+                self._images, features=self.features,
+                normalisation=self.normalisation, cosine_mask=mask,
+                n_jobs=kwargs['n_jobs'], prefix=prefix, verbose=verbose)
 
         # Train correlation filter
         self.model = CorrelationFilter(
-            normalized_data, algorithm=algorithm, filter_shape=filter_shape,
-            response_covariance=response_covariance, l=l, boundary=boundary,
-            prefix=prefix, verbose=verbose)
+            normalized_data, algorithm=self.algorithm,
+            filter_shape=self.filter_shape,
+            response_covariance=kwargs['response_covariance'], l=kwargs['l'],
+            boundary=self.boundary, backend=kwargs['backend'], prefix=prefix,
+            verbose=verbose)
+
+        # Release the training data
+        self._images = None
+        self._data = None
+        self._training_kwargs = None
+        return self
 
     @property
     def n_channels(self):
         r"""
-        Returns the model's number of channels.
+        Returns the model's number of channels. Note that it trains a lazy
+        detector that has not been trained yet.
 
         :type: `int`
         """
-        return self.model.n_channels
+        return self.train().model.n_channels
 
     def detect(self, image, scales='all', diagonal=400, score_thresh=0.025,
                overlap_thresh=0.1, return_responses=False, prefix='Detecting ',
@@ -331,6 +543,9 @@ class Detector(object):
         elif scales is None:
             scales = [1.]
 
+        # Get the trained model
+        model = self.train().model
+
         # Compute features of the original image
         feat_image = self.features(tmp_image)
 
@@ -358,7 +573,7 @@ class Detector(object):
                 scaled_image, normalisation=self.normalisation, cosine_mask=None)
 
             # Convolve image with filter
-            response = self.model.convolve(scaled_image, as_sum=True)
+            response = model.convolve(scaled_image, as_sum=True)
             if return_responses:
                 responses.append(Image(response))
 
@@ -459,7 +674,7 @@ class Detector(object):
         viewer : `ImageViewer`
             The image viewing object.
         """
-        return self.model.view_spatial_filter(
+        return self.train().model.view_spatial_filter(
             figure_id=figure_id, new_figure=new_figure, channels=channels,
             interpolation=interpolation, cmap_name=cmap_name, alpha=alpha,
             render_axes=render_axes, axes_font_name=axes_font_name,
@@ -545,7 +760,7 @@ class Detector(object):
         viewer : `ImageViewer`
             The image viewing object.
         """
-        return self.model.view_frequency_filter(
+        return self.train().model.view_frequency_filter(
             figure_id=figure_id, new_figure=new_figure, channels=channels,
             interpolation=interpolation, cmap_name=cmap_name, alpha=alpha,
             render_axes=render_axes, axes_font_name=axes_font_name,
@@ -555,6 +770,12 @@ class Detector(object):
             axes_y_ticks=axes_y_ticks, figure_size=figure_size)
 
     def __str__(self):
+        if self.model is None:
+            # Do not train a lazy detector just for printing it
+            return r"""Correlation Filter Detector
+ - Features: {}
+ - Not trained
+ """.format(name_of_callable(self.features))
         output_str = r"""Correlation Filter Detector
  - Features: {}
  - Channels: {}
@@ -581,8 +802,9 @@ class Classification(object):
         The shape of the filter.
     features : `callable`, optional
         The holistic dense features to be extracted from the images.
-    normalisation : `callable`, optional
-        The callable to be used for normalising the images.
+    normalisation : `callable` or ``None``, optional
+        The callable to be used for normalising the images. If ``None``, then
+        no normalisation is applied.
     cosine_mask : `bool`, optional
         If ``True``, then a cosine mask (Hanning window) will be applied on the
         images.
@@ -593,6 +815,18 @@ class Classification(object):
         Regularization parameter of the correlation filter.
     boundary : ``{'constant', 'symmetric'}``, optional
         Determines the type of padding that will be applied on the images.
+    n_jobs : `int`, optional
+        The number of processes used for pre-processing the training images.
+        If ``-1``, then all the available CPUs are used. Note that the images
+        are pre-processed in parallel only if there are at least
+        ``MIN_IMAGES_FOR_PARALLEL_PREPROCESSING`` of them.
+    backend : ``{'numpy', 'cupy'}``, optional
+        If 'cupy', then the correlation filter is trained on the GPU using
+        `cupy`. The pre-processing of the images is always performed on the
+        CPU.
+    lazy : `bool`, optional
+        If ``True``, then each class detector is pre-processed and trained only
+        when it is first needed.
     prefix : `str`, optional
         The prefix of the progress bar.
     verbose : `bool`, optional
@@ -612,7 +846,7 @@ class Classification(object):
                  filter_shape=(29, 29), features=fast_dsift_hsi,
                  normalisation=normalise_norm_array, cosine_mask=False,
                  response_covariance=2, l=0.01, boundary='symmetric',
-                 verbose=True):
+                 n_jobs=1, backend='numpy', lazy=False, verbose=True):
         # Check images
         if len(images) != len(labels):
             raise ValueError('The provided images and labels have different '
@@ -636,7 +870,8 @@ class Classification(object):
                 images[cl], algorithm=algorithm, filter_shape=filter_shape,
                 features=features, normalisation=normalisation,
                 cosine_mask=cosine_mask, response_covariance=response_covariance,
-                l=l, boundary=boundary, prefix=class_str, verbose=verbose)
+                l=l, boundary=boundary, n_jobs=n_jobs, backend=backend,
+                lazy=lazy, prefix=class_str, verbose=verbose)
             self.models.append(detector)
 
     def fit(self, image, scales='all', diagonal=400, score_thresh=0.025,
@@ -733,7 +968,8 @@ class Classification(object):
             If ``'coloured'``, then the style of the widget will be coloured. If
             ``minimal``, then the style is simple using black and white colours.
         """
-        filters = [Image(m.model.correlation_filter) for m in self.models]
+        filters = [Image(m.train().model.correlation_filter)
+                   for m in self.models]
         try:
             from menpowidgets import visualize_images
             visualize_images(filters, figure_size=figure_size,
@@ -760,7 +996,8 @@ class Classification(object):
         """
         filters = []
         for m in self.models:
-            freq_f = np.abs(np.fft.fftshift(np.fft.fft2(m.model.correlation_filter)))
+            freq_f = np.abs(np.fft.fftshift(np.fft.fft2(
+                m.train().model.correlation_filter)))
             filters.append(Image(freq_f))
         try:
             from menpowidgets import visualize_images
@@ -1,15 +1,71 @@
 import numpy as np
-from numpy.fft import fft2, ifft2, ifftshift
 from functools import partial
-from scipy.sparse import spdiags, eye as speye
-from scipy.sparse.linalg import spsolve
+
+try:
+    # Use pyfftw (through its scipy.fft compatible interface), if available,
+    # and cache its FFT plans
+    import pyfftw
+    from pyfftw.interfaces.scipy_fft import rfft2, irfft2
+    pyfftw.interfaces.cache.enable()
+except ImportError:
+    try:
+        from scipy.fft import rfft2, irfft2
+    except ImportError:
+        # scipy.fft requires scipy>=1.4, so fall back to the single threaded
+        # numpy.fft, which does not accept the workers argument
+        from numpy.fft import rfft2, irfft2
+        _FFT_KWARGS = {}
+    else:
+        _FFT_KWARGS = {'workers': -1}
+else:
+    _FFT_KWARGS = {'workers': -1}
 
 from menpofit.visualize import print_progress
 from menpofit.math.fft_utils import pad, crop
 
 
+# The number of training images whose FFTs are computed with a single batched
+# call. It bounds the memory required by the (complex) extended images.
+FFT_BATCH_SIZE = 64
+
+
+def fft_backend(backend='numpy'):
+    r"""
+    Method that returns the array module and the real 2D FFT functions of the
+    specified backend.
+
+    Parameters
+    ----------
+    backend : ``{'numpy', 'cupy'}``, optional
+        If 'numpy', then the FFTs are computed on the CPU (using all the
+        available cores, unless `scipy.fft` is not available). If 'cupy', then the FFTs are computed on the GPU
+        using `cupy`.
+
+    Returns
+    -------
+    xp : `module`
+        The array module, i.e. `numpy` or `cupy`.
+    rfft2 : `callable`
+        The real 2D FFT over the last two axes.
+    irfft2 : `callable`
+        The inverse of ``rfft2``.
+    """
+    if backend == 'numpy':
+        return (np, partial(rfft2, **_FFT_KWARGS),
+                partial(irfft2, **_FFT_KWARGS))
+    elif backend == 'cupy':
+        try:
+            import cupy
+        except ImportError:
+            raise ImportError("The 'cupy' backend requires cupy to be "
+                              "installed.")
+        return cupy, cupy.fft.rfft2, cupy.fft.irfft2
+    else:
+        raise ValueError("Backend can be either 'numpy' or 'cupy'.")
+
+
 def train_mosse(X, y, l=0.01, boundary='symmetric', crop_filter=True,
-                prefix='', verbose=True):
+                backend='numpy', prefix='', verbose=True):
     r"""
     Minimum Output Sum of Squared Errors (MOSSE) filter.
 
@@ -27,6 +83,9 @@ def train_mosse(X, y, l=0.01, boundary='symmetric', crop_filter=True,
         If ``True``, the shape of the MOSSE filter is the same as the shape
         of the desired response. If ``False``, the filter's shape is equal to:
         ``X[0].shape + y.shape - 1``.
+    backend : ``{'numpy', 'cupy'}``, optional
+        If 'cupy', then the FFTs and the filter computation are performed on
+        the GPU. The images are transferred to the GPU in batches.
     prefix : `str`, optional
         The prefix of the progress bar.
     verbose : `bool`, optional
@@ -56,34 +115,41 @@ def train_mosse(X, y, l=0.01, boundary='symmetric', crop_filter=True,
     ext_w = wx + wy - 1
     ext_shape = (ext_h, ext_w)
 
+    # get array module and fft functions of the backend
+    xp, xp_rfft2, xp_irfft2 = fft_backend(backend)
+
     # extend desired response
     ext_y = pad(y, ext_shape)
-    # fft of extended desired response
-    fft_ext_y = fft2(ext_y)
+    # fft of extended desired response. Since the images and the response are
+    # real, only half of their spectrum needs to be computed.
+    fft_ext_y = xp_rfft2(xp.asarray(ext_y))
 
     # auto and cross spectral energy matrices
     sXX = 0
     sXY = 0
-    # for each training image and desired response
+    # for each batch of training images
     wrap = partial(print_progress, prefix=prefix + 'Learning filter',
                    verbose=verbose, end_with_newline=False)
-    for x in wrap(X):
-        # extend image
-        ext_x = pad(x, ext_shape, boundary=boundary)
-        # fft of extended image
-        fft_ext_x = fft2(ext_x)
+    for start in wrap(range(0, n, FFT_BATCH_SIZE)):
+        # extend images
+        ext_x = xp.asarray(pad(X[start:start + FFT_BATCH_SIZE], ext_shape,
+                               boundary=boundary))
+        # fft of extended images. The spectra of single precision images are
+        # accumulated in double precision.
+        fft_ext_x = xp_rfft2(ext_x).astype(xp.complex128, copy=False)
 
         # update auto and cross spectral energy matrices
-        sXX += fft_ext_x.conj() * fft_ext_x
-        sXY += fft_ext_x.conj() * fft_ext_y
+        sXX += xp.sum(fft_ext_x.conj() * fft_ext_x, axis=0)
+        sXY += xp.sum(fft_ext_x.conj(), axis=0) * fft_ext_y
 
     # compute desired correlation filter
     fft_ext_f = sXY / (sXX + l)
-    # reshape extended filter to extended image shape
-    fft_ext_f = fft_ext_f.reshape((k, ext_h, ext_w))
 
     # compute extended filter inverse fft
-    f = np.real(ifftshift(ifft2(fft_ext_f), axes=(-2, -1)))
+    f = xp.fft.ifftshift(xp_irfft2(fft_ext_f, s=ext_shape), axes=(-2, -1))
+    if xp is not np:
+        # transfer filter back from the GPU
+        f = xp.asnumpy(f)
 
     if crop_filter:
         # crop extended filter to match desired response shape
@@ -97,7 +163,7 @@ def train_mosse(X, y, l=0.01, boundary='symmetric', crop_filter=True,
 
 
 def train_mccf(X, y, l=0.01, boundary='symmetric', crop_filter=True,
-               prefix='', verbose=True):
+               backend='numpy', prefix='', verbose=True):
     r"""
     Multi-Channel Correlation (MCCF) Filter.
 
@@ -115,6 +181,9 @@ def train_mccf(X, y, l=0.01, boundary='symmetric', crop_filter=True,
         If ``True``, the shape of the MCCF filter is the same as the shape
         of the desired response. If ``False``, the filter's shape is equal to:
         ``X[0].shape + y.shape - 1``.
+    backend : ``{'numpy', 'cupy'}``, optional
+        If 'cupy', then the FFTs and the filter computation are performed on
+        the GPU. The images are transferred to the GPU in batches.
     prefix : `str`, optional
         The prefix of the progress bar.
     verbose : `bool`, optional
@@ -142,45 +211,54 @@ def train_mccf(X, y, l=0.01, boundary='symmetric', crop_filter=True,
     ext_h = hx + hy - 1
     ext_w = wx + wy - 1
     ext_shape = (ext_h, ext_w)
-    # extended dimensionality
-    ext_d = ext_h * ext_w
+    # extended dimensionality of the (half) spectrum
+    ext_w_half = ext_w // 2 + 1
+    ext_d = ext_h * ext_w_half
+
+    # get array module and fft functions of the backend
+    xp, xp_rfft2, xp_irfft2 = fft_backend(backend)
 
     # extend desired response
     ext_y = pad(y, ext_shape)
-    # fft of extended desired response
-    fft_ext_y = fft2(ext_y)
-
-    # extend images
-    ext_X = pad(X, ext_shape, boundary=boundary)
-
-    # auto and cross spectral energy matrices
+    # fft of extended desired response. Since the images and the response are
+    # real, only half of their spectrum needs to be computed.
+    fft_ext_y = xp_rfft2(xp.asarray(ext_y))
+    # vectorize extended desired response fft
+    vec_fft_y = fft_ext_y.ravel()
+
+    # auto and cross spectral energy matrices, stored as one k x k matrix and
+    # one k vector per frequency
     sXX = 0
     sXY = 0
-    # for each training image and desired response
+    # for each batch of training images
     wrap = partial(print_progress, prefix=prefix + 'Learning filter',
                    verbose=verbose, end_with_newline=False)
-    for ext_x in wrap(ext_X):
-        # fft of extended image
-        fft_ext_x = fft2(ext_x)
-
-        # store extended image fft as sparse diagonal matrix
-        diag_fft_x = spdiags(fft_ext_x.reshape((k, -1)),
-                             -np.arange(0, k) * ext_d, ext_d * k, ext_d).T
-        # vectorize extended desired response fft
-        diag_fft_y = fft_ext_y.ravel()
+    for start in wrap(range(0, n, FFT_BATCH_SIZE)):
+        # extend images
+        ext_x = xp.asarray(pad(X[start:start + FFT_BATCH_SIZE], ext_shape,
+                               boundary=boundary))
+        # fft of extended images, vectorized per channel. The linear systems
+        # can be ill-conditioned, thus, even though the training images are
+        # stored in single precision, each batch is transformed, accumulated
+        # and solved in double precision.
+        fft_ext_x = xp_rfft2(ext_x.astype(xp.float64, copy=False))
+        fft_ext_x = fft_ext_x.reshape((-1, k, ext_d))
 
         # update auto and cross spectral energy matrices
-        sXX += diag_fft_x.conj().T.dot(diag_fft_x)
-        sXY += diag_fft_x.conj().T.dot(diag_fft_y)
+        sXX += xp.einsum('nid,njd->dij', fft_ext_x.conj(), fft_ext_x)
+        sXY += xp.einsum('nid,d->di', fft_ext_x.conj(), vec_fft_y)
 
     # solve ext_d independent k x k linear systems (with regularization)
     # to obtain desired extended multi-channel correlation filter
-    fft_ext_f = spsolve(sXX + l * speye(sXX.shape[-1]), sXY)
+    fft_ext_f = xp.linalg.solve(sXX + l * xp.eye(k), sXY[..., None])[..., 0]
     # reshape extended filter to extended image shape
-    fft_ext_f = fft_ext_f.reshape((k, ext_h, ext_w))
+    fft_ext_f = fft_ext_f.T.reshape((k, ext_h, ext_w_half))
 
     # compute filter inverse fft
-    f = np.real(ifftshift(ifft2(fft_ext_f), axes=(-2, -1)))
+    f = xp.fft.ifftshift(xp_irfft2(fft_ext_f, s=ext_shape), axes=(-2, -1))
+    if xp is not np:
+        # transfer filter back from the GPU
+        f = xp.asnumpy(f)
 
     if crop_filter:
         # crop extended filter to match desired response shape
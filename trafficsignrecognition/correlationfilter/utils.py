@@ -1,4 +1,5 @@
 import numpy as np
+from functools import lru_cache
 from scipy.stats import multivariate_normal
 
 from menpofit.math.fft_utils import pad, crop
@@ -30,25 +31,41 @@ def centered_meshgrid(shape):
     return np.rollaxis(sampling_grid, 0, 3)
 
 
+@lru_cache(maxsize=16)
+def _cached_gaussian_response(shape, cov_shape, cov_values):
+    cov = np.array(cov_values).reshape(cov_shape)
+    grid = centered_meshgrid(shape)
+    response = multivariate_normal(mean=np.zeros(2), cov=cov).pdf(grid)
+    response = response[None, ...]
+    # The response is shared between callers, so protect it from modifications
+    response.setflags(write=False)
+    return response
+
+
 def gaussian_response(shape, cov=2):
     r"""
     Method that returns a 2D gaussian response centered in the middle with the
-    specified shape.
+    specified shape. The responses are cached per shape and covariance, thus
+    the returned array is read-only.
 
     Parameters
     ----------
     shape : (`int`, `int`)
         The desired shape.
-    cov : `int`, optional
-        The covariance of the normal distribution.
+    cov : `int` or `float` or `list` or `ndarray`, optional
+        The covariance of the normal distribution, in any form accepted by
+        `scipy.stats.multivariate_normal`.
 
     Returns
     -------
     response : ``(1,) + shape`` `ndarray`
         The Gaussian response.
     """
-    grid = centered_meshgrid(shape)
-    return multivariate_normal(mean=np.zeros(2), cov=cov).pdf(grid)[None, ...]
+    # The covariance may be an array or a list, so it is converted to a
+    # hashable cache key
+    cov = np.asarray(cov, dtype=float)
+    return _cached_gaussian_response(tuple(shape), cov.shape,
+                                     tuple(cov.ravel().tolist()))
 
 
 def conv2d(image, f, mode='same', boundary='symmetric'):
@@ -0,0 +1,57 @@
+# cython: boundscheck=False, wraparound=False, cdivision=True
+from cython cimport floating
+from cython.parallel cimport prange
+from libc.math cimport sqrt, acos, M_PI
+
+
+def rgb2hsi_kernel(const floating[:, ::1] rgb, floating[:, ::1] hsi,
+                  double eps):
+    r"""
+    Computes the HSI channels of the given flattened RGB channels in a single
+    parallel (OpenMP) pass over the pixels, writing the result directly into
+    the provided flattened HSI array.
+
+    Parameters
+    ----------
+    rgb : ``(3, n_pixels)`` `ndarray`
+        The C-contiguous RGB channels.
+    hsi : ``(3, n_pixels)`` `ndarray`
+        The C-contiguous array, with the same dtype as ``rgb``, in which to
+        store the HSI channels.
+    eps : `float`
+        The epsilon that guards the divisions.
+    """
+    cdef Py_ssize_t p, n = rgb.shape[1]
+    cdef double r, g, b, rg, rb, gb, den, theta, total, min_rgb, sat
+    cdef double two_pi = 2 * M_PI
+    for p in prange(n, nogil=True, schedule='static'):
+        r = rgb[0, p]
+        g = rgb[1, p]
+        b = rgb[2, p]
+        rg = r - g
+        rb = r - b
+        gb = g - b
+
+        # Compute hue channel
+        den = sqrt(rg * rg + rb * gb) + eps
+        theta = acos(0.5 * (rg + rb) / den)
+        if b > g:
+            theta = two_pi - theta
+
+        # Compute Saturation channel
+        total = r + g + b
+        if total == 0:
+            total = eps
+        min_rgb = r
+        if g < min_rgb:
+            min_rgb = g
+        if b < min_rgb:
+            min_rgb = b
+        sat = 1 - 3 * min_rgb / total
+        if sat == 0:
+            theta = 0
+
+        hsi[0, p] = <floating>(theta / two_pi)
+        hsi[1, p] = <floating>sat
+        # Compute Intensity channel
+        hsi[2, p] = <floating>((r + g + b) / 3)
@@ -1,21 +1,180 @@
 import numpy as np
+from functools import partial
 
-from menpo.image import Image
 from menpo.feature import ndfeature, igo, fast_dsift, no_op
 
 from ..normalisation import image_normalisation
 
 
+# The epsilon that guards the divisions of the RGB to HSI conversion
+RGB2HSI_EPS = 2 ** -50
+
+
+# The luminosity coefficients (CCIR 601) used by menpo to convert an RGB image
+# to greyscale, i.e. approximately (0.2989, 0.5870, 0.1140)
+GREYSCALE_LUMINOSITY_COEF = np.linalg.inv(
+    np.array([[1.0, 0.956, 0.621],
+              [1.0, -0.272, -0.647],
+              [1.0, -1.106, 1.703]]))[0, :]
+
+
+def _hsi_dtype(pixels):
+    r"""
+    Returns the floating point dtype of the HSI channels of the given RGB
+    pixels, so that single precision images are not promoted to double
+    precision.
+    """
+    return np.result_type(pixels.dtype, np.float32)
+
+
+def _rgb2hsi_numpy(r, g, b, h, s, i):
+    r"""
+    Computes the HSI channels of the given RGB channels with NumPy ufuncs,
+    writing the result directly into the provided ``h``, ``s`` and ``i``
+    arrays.
+    """
+    eps = RGB2HSI_EPS
+    rg = r - g
+    rb = r - b
+    gb = g - b
+    # num = 0.5 * ((r - g) + (r - b))
+    np.add(rg, rb, out=h)
+    np.multiply(h, 0.5, out=h)
+    # den = sqrt((r - g) ** 2 + (r - b) * (g - b))
+    np.multiply(rg, rg, out=rg)
+    np.multiply(rb, gb, out=rb)
+    np.add(rg, rb, out=rg)
+    np.sqrt(rg, out=rg)
+    np.add(rg, eps, out=rg)
+    # theta = arccos(num / (den + eps))
+    np.divide(h, rg, out=h)
+    np.arccos(h, out=h)
+
+    # Compute hue channel. The b > g correction is a masked ufunc, so that it
+    # is applied in a single pass without materialising the selected values.
+    np.subtract(2 * np.pi, h, out=h, where=b > g)
+    np.divide(h, 2 * np.pi, out=h)
+
+    # Compute Saturation channel
+    np.minimum(r, g, out=s)
+    np.minimum(s, b, out=s)
+    np.add(r, g, out=i)
+    np.add(i, b, out=i)
+    np.multiply(s, 3, out=s)
+    np.divide(s, np.where(i == 0, eps, i), out=s)
+    np.subtract(1, s, out=s)
+
+    # Zero the hue of achromatic pixels with a masked write, which avoids the
+    # gather/scatter of boolean indexing
+    np.copyto(h, 0, where=s == 0)
+
+    # Compute Intensity channel
+    np.divide(i, 3, out=i)
+
+
+try:
+    # The optional compiled (Cython/OpenMP) extension
+    from ._rgb2hsi import rgb2hsi_kernel as _rgb2hsi_ext
+except ImportError:
+    _rgb2hsi_ext = None
+
+
+try:
+    import numexpr as ne
+except ImportError:
+    _rgb2hsi_numexpr = None
+else:
+    def _rgb2hsi_numexpr(r, g, b, h, s, i):
+        r"""
+        Computes the HSI channels of the given RGB channels with fused
+        multi-threaded `numexpr` expressions, writing the result directly into
+        the provided ``h``, ``s`` and ``i`` arrays.
+        """
+        eps = RGB2HSI_EPS
+        two_pi = 2 * np.pi
+        # The constants are double precision, so allow the results to be
+        # stored in single precision outputs
+        evaluate = partial(ne.evaluate, casting='same_kind')
+        # Compute hue channel
+        evaluate('arccos(0.5 * ((r - g) + (r - b)) / '
+                 '(sqrt((r - g) ** 2 + (r - b) * (g - b)) + eps))', out=h)
+        evaluate('where(b > g, two_pi - h, h) / two_pi', out=h)
+        # Compute Saturation channel
+        evaluate('r + g + b', out=i)
+        evaluate('1 - 3 * where(r < g, where(r < b, r, b), where(g < b, g, b))'
+                 ' / where(i == 0, eps, i)', out=s)
+        evaluate('where(s == 0, 0, h)', out=h)
+        # Compute Intensity channel
+        evaluate('i / 3', out=i)
+
+
+try:
+    from numba import njit, prange
+except ImportError:
+    _rgb2hsi_kernel = None
+else:
+    # Use all the fast-math flags except 'nnan' and 'ninf', so that the
+    # handling of NaN values matches the NumPy implementation.
+    @njit(parallel=True, cache=True,
+          fastmath={'nsz', 'arcp', 'contract', 'afn', 'reassoc'})
+    def _rgb2hsi_kernel(r, g, b, h, s, i):
+        r"""
+        Computes the HSI channels of the given flattened RGB channels in a
+        single parallel pass over the pixels, writing the result directly into
+        the provided flattened ``h``, ``s`` and ``i`` arrays. As in the
+        compiled extension, the per-pixel arithmetic is performed in double
+        precision and only the stored results are cast to the output dtype.
+        """
+        eps = RGB2HSI_EPS
+        two_pi = 2 * np.pi
+        for p in prange(r.size):
+            rp = np.float64(r[p])
+            gp = np.float64(g[p])
+            bp = np.float64(b[p])
+            rg = rp - gp
+            rb = rp - bp
+            gb = gp - bp
+
+            # Compute hue channel
+            den = np.sqrt(rg * rg + rb * gb) + eps
+            theta = np.arccos(0.5 * (rg + rb) / den)
+            if bp > gp:
+                theta = two_pi - theta
+
+            # Compute Saturation channel
+            total = rp + gp + bp
+            if total == 0:
+                total = eps
+            sat = 1 - 3 * min(rp, gp, bp) / total
+            if sat == 0:
+                theta = 0.
+
+            h[p] = theta / two_pi
+            s[p] = sat
+            # Compute Intensity channel
+            i[p] = (rp + gp + bp) / 3
+
+    # The kernel is compiled lazily on its first call (and cached on disk),
+    # rather than warmed up on import. Running the parallel kernel on import
+    # would start numba's threading layer in every process that imports this
+    # module, which makes it unsafe to fork.
+
+
 @ndfeature
-def rgb2hsi(pixels):
+def rgb2hsi(pixels, out=None):
     r"""
-    Converts an RGB image to HSI.
+    Converts an RGB image to HSI. The conversion is performed by the compiled
+    (Cython) extension, if it has been built, otherwise by a `numba` parallel
+    kernel or by fused `numexpr` expressions, if either is installed.
 
     Parameters
     ----------
     pixels : `menpo.image.Image` or subclass or ``(3, X, Y)`` `ndarray`
         Either the menpo image object itself or an array where the first
         dimension is interpreted as the 3 RGB channels.
+    out : ``(3, X, Y)`` `ndarray` or ``None``, optional
+        A writable array in which to store the result. If ``None``, then a new
+        array is allocated.
 
     Returns
     -------
@@ -26,34 +185,43 @@ def rgb2hsi(pixels):
     g = pixels[1, ...]
     b = pixels[2, ...]
 
-    # Implement the conversion equations
-    eps = 2 ** -50
-    num = 0.5 * ((r - g) + (r - b))
-    den = np.sqrt((r - g) ** 2 + (r - b) * (g - b))
-    theta = np.arccos(num / (den + eps))
-
-    # Compute hue channel
-    h = theta
-    h[b > g] = 2 * np.pi - h[b > g]
-    h /= 2 * np.pi
-
-    # Compute Saturation channel
-    num = np.minimum(np.minimum(r, g), b)
-    den = r + g + b
-    den[den == 0] = eps
-    s = 1 - 3 * num / den
-
-    h[s == 0] = 0
+    # Allocate the output (if not provided) and compute each channel directly
+    # into its slice
+    hsi = out
+    if hsi is None:
+        hsi = np.empty((3,) + pixels.shape[1:], dtype=_hsi_dtype(pixels))
+
+    if (_rgb2hsi_ext is not None and hsi.flags.c_contiguous and
+            hsi.dtype == pixels.dtype and
+            hsi.dtype in (np.float32, np.float64)):
+        # The compiled extension requires matching floating point dtypes
+        _rgb2hsi_ext(np.ascontiguousarray(pixels).reshape((3, -1)),
+                     hsi.reshape((3, -1)), RGB2HSI_EPS)
+    elif _rgb2hsi_kernel is not None and hsi.flags.c_contiguous:
+        # The kernel works on flat arrays. The reshape of the contiguous
+        # output is a view, so the result is written in place.
+        flat_hsi = hsi.reshape((3, -1))
+        _rgb2hsi_kernel(r.reshape(-1), g.reshape(-1), b.reshape(-1),
+                        flat_hsi[0], flat_hsi[1], flat_hsi[2])
+    elif _rgb2hsi_numexpr is not None:
+        _rgb2hsi_numexpr(r, g, b, hsi[0], hsi[1], hsi[2])
+    else:
+        _rgb2hsi_numpy(r, g, b, hsi[0], hsi[1], hsi[2])
 
-    # Compute Intensity channel
-    i = (r + g + b) / 3
+    return hsi
 
-    hsi = np.zeros((3,) + pixels.shape[1:])
-    hsi[0] = h
-    hsi[1] = s
-    hsi[2] = i
 
-    return hsi
+def _concatenate_hsi(pixels, feature_pixels):
+    r"""
+    Concatenates the given feature channels with the HSI channels of the RGB
+    pixels. The HSI channels are computed directly into the output array.
+    """
+    n_channels = feature_pixels.shape[0]
+    dtype = np.result_type(feature_pixels.dtype, _hsi_dtype(pixels))
+    out = np.empty((n_channels + 3,) + pixels.shape[1:], dtype=dtype)
+    out[:n_channels] = feature_pixels
+    rgb2hsi(pixels, out=out[n_channels:])
+    return out
 
 
 @ndfeature
@@ -72,7 +240,7 @@ def rgb_hsi(pixels):
     hsi : `menpo.image.Image` or subclass or ``(6, X, Y)`` `ndarray`
         The 6-channels image that occurs by concatenating RGB and HSI.
     """
-    return np.concatenate((pixels, rgb2hsi(pixels)))
+    return _concatenate_hsi(pixels, pixels)
 
 
 @ndfeature
@@ -91,8 +259,12 @@ def igo_hsi(pixels):
     hsi : `menpo.image.Image` or subclass or ``(5, X, Y)`` `ndarray`
         The 5-channels image that occurs by concatenating IGO and HSI.
     """
-    igo_pixels = igo(Image(pixels).as_greyscale()).pixels
-    return np.concatenate((igo_pixels, rgb2hsi(pixels)))
+    # Compute the greyscale image directly as a dot product over the channels,
+    # instead of creating a menpo image and calling as_greyscale()
+    coef = GREYSCALE_LUMINOSITY_COEF.astype(_hsi_dtype(pixels))
+    grey = np.tensordot(coef, pixels, axes=1)
+    igo_pixels = igo(grey[None])
+    return _concatenate_hsi(pixels, igo_pixels)
 
 
 @ndfeature
@@ -111,7 +283,7 @@ def fast_dsift_hsi(pixels):
     hsi : `menpo.image.Image` or subclass or ``(11, X, Y)`` `ndarray`
         The 11-channels image that occurs by concatenating Dense SIFT and HSI.
     """
-    return np.concatenate((fast_dsift(pixels), rgb2hsi(pixels)))
+    return _concatenate_hsi(pixels, fast_dsift(pixels))
 
 
 def image_pyramid(image, scales, features=no_op, normalisation=no_op):
@@ -1,4 +1,5 @@
 import numpy as np
+from functools import lru_cache
 
 from menpo.feature import ndfeature, no_op
 
@@ -38,9 +39,79 @@ def normalise_norm_array(array):
     return centered_arr / np.linalg.norm(centered_arr)
 
 
+try:
+    from numba import njit
+except ImportError:
+    _normalise_norm_kernel = None
+else:
+    # The numpy error model is used so that a constant array results in NaN
+    # values, as in normalise_norm_array, rather than a ZeroDivisionError.
+    @njit(cache=True, error_model='numpy',
+          fastmath={'nsz', 'arcp', 'contract', 'afn', 'reassoc'})
+    def _normalise_norm_kernel(array, out):
+        r"""
+        Normalises the given flattened array so that it has zero mean and unit
+        norm, writing the result directly into the flattened ``out`` array.
+        """
+        n = array.size
+        mean = 0.
+        for p in range(n):
+            mean += array[p]
+        mean /= n
+        sq_norm = 0.
+        for p in range(n):
+            d = array[p] - mean
+            sq_norm += d * d
+        norm = np.sqrt(sq_norm)
+        for p in range(n):
+            out[p] = (array[p] - mean) / norm
+
+
+def normalise_norm_array_into(array, out):
+    r"""
+    Method that normalises a given array so that it has zero mean and unit
+    norm, writing the result directly into the provided array. It is
+    equivalent to ``out[...] = normalise_norm_array(array)`` without any
+    intermediate arrays. If `numba` is installed, then the normalisation is
+    performed by a compiled kernel.
+
+    Parameters
+    ----------
+    array : `ndarray`
+        The input array.
+    out : `ndarray`
+        The array, with the same shape as ``array``, in which to store the
+        normalised array.
+
+    Raises
+    ------
+    ValueError
+        The array and out must have the same shape.
+    """
+    if array.shape != out.shape:
+        raise ValueError('The array and out must have the same shape, '
+                         '{} != {}'.format(array.shape, out.shape))
+    if _normalise_norm_kernel is not None and out.flags.c_contiguous:
+        _normalise_norm_kernel(array.reshape(-1), out.reshape(-1))
+    else:
+        np.subtract(array, np.mean(array), out=out)
+        np.divide(out, np.linalg.norm(out), out=out)
+
+
+@lru_cache(maxsize=8)
+def _cached_cosine_mask(shape):
+    cy = np.hanning(shape[0])
+    cx = np.hanning(shape[1])
+    mask = cy[..., None].dot(cx[None, ...])
+    # The mask is shared between callers, so protect it from modifications
+    mask.setflags(write=False)
+    return mask
+
+
 def create_cosine_mask(shape):
     r"""
-    Method that creates a cosine mask (Hanning function).
+    Method that creates a cosine mask (Hanning function). The masks are cached
+    per shape, thus the returned array is read-only.
 
     Parameters
     ----------
@@ -52,9 +123,7 @@ def create_cosine_mask(shape):
     cosine_mask : `ndarray`
         The cosine mask with the specified shape.
     """
-    cy = np.hanning(shape[0])
-    cx = np.hanning(shape[1])
-    return cy[..., None].dot(cx[None, ...])
+    return _cached_cosine_mask(tuple(shape))
 
 
 @ndfeature
@@ -71,9 +140,10 @@ def image_normalisation(pixels, normalisation=normalise_norm_array,
     pixels : `menpo.image.Image` or subclass or ``(C, X, Y)`` `ndarray`
         Either the menpo image object itself or an array where the first
         dimension is interpreted as the channels.
-    normalisation : `callable`, optional
+    normalisation : `callable` or ``None``, optional
         A method that performs some kind of normalisation. It must accept and
-        return either a `menpo.image.Image` or a ``(C, X, Y)`` `ndarray`.
+        return either a `menpo.image.Image` or a ``(C, X, Y)`` `ndarray`. If
+        ``None``, then no normalisation is applied.
     cosine_mask : `ndarray` or ``None``, optional
         The cosine mask (Hanning window) to be applied on the image. If ``None``,
         then no mask is applied.
@@ -84,7 +154,8 @@ def image_normalisation(pixels, normalisation=normalise_norm_array,
         The normalised image.
     """
     # Normalise image
-    pixels = normalisation(pixels)
+    if normalisation is not None:
+        pixels = normalisation(pixels)
     # Apply cosine mask if specified
     if cosine_mask is not None:
         pixels = cosine_mask * pixels
@@ -0,0 +1,18 @@
+class SlotsPickleMixin(object):
+    r"""
+    Mixin that makes classes with ``__slots__`` picklable. The state is
+    pickled as a `dict` of attributes, which is also the state of the objects
+    that were pickled before the introduction of ``__slots__``, thus these can
+    still be unpickled.
+    """
+    __slots__ = ()
+
+    def __getstate__(self):
+        return {name: getattr(self, name)
+                for cls in type(self).__mro__
+                for name in getattr(cls, '__slots__', ())
+                if hasattr(self, name)}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)